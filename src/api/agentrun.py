@@ -1,11 +1,17 @@
 """AgentRun - Run Python code in an isolated Docker container"""
 
 import ast
+import codecs
+import hashlib
 import os
+import re
 import sys
 import tarfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from threading import Thread
+from threading import Lock, Thread
 from typing import Any, Union
 from uuid import uuid4
 
@@ -15,6 +21,74 @@ from RestrictedPython import compile_restricted
 
 from utils import get_approved_libraries
 
+# Shared pool for the post-execution clean up, so each run does not spawn its own thread
+_CLEANUP_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="docker")
+
+# LRU cache of safety_check results keyed by a 16-byte digest of the code, so cached
+# entries cost a fixed amount of memory regardless of the size of the submission
+SAFETY_CACHE_SIZE = 1024
+_safety_cache = OrderedDict()
+_safety_cache_lock = Lock()
+
+# Maximum number of output bytes kept from a command, anything beyond is read and discarded
+MAX_OUTPUT_BYTES = 4 * 1024 * 1024
+
+# Run inside the container to SIGKILL the processes executing the script given as argument.
+# The runner image does not ship procps, so pkill is not available there.
+_KILL_SCRIPT = """
+import os, signal, sys
+target = sys.argv[1].encode()
+for pid in filter(str.isdigit, os.listdir("/proc")):
+    if int(pid) == os.getpid():
+        continue
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            if target in f.read().split(b"\\0"):
+                os.kill(int(pid), signal.SIGKILL)
+    except OSError:
+        pass
+"""
+
+# Cheap pre-filter for parse_dependencies, matches the keyword of any import statement
+_IMPORT_KEYWORD_RE = re.compile(r"\bimport\b")
+
+
+class _ImportCollector(ast.NodeVisitor):
+    """Collect the non-standard-library modules imported by a module's AST.
+
+    Import nodes are always statements, so only statement bodies are visited;
+    expression subtrees are never walked.
+    """
+
+    _BODY_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+
+    def __init__(self) -> None:
+        self.dependencies = []
+
+    def _add(self, module_name: str) -> None:
+        if (
+            module_name
+            and module_name not in sys.stdlib_module_names
+            and module_name not in sys.builtin_module_names
+        ):
+            self.dependencies.append(module_name)
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            # Get the base module name. E.g. for "import foo.bar", it's "foo"
+            self._add(alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        self._add(node.module.split(".")[0] if node.module else "")
+
+    def generic_visit(self, node: ast.AST) -> None:
+        for field in self._BODY_FIELDS:
+            children = getattr(node, field, None)
+            if isinstance(children, list):
+                for child in children:
+                    self.visit(child)
+
+
 class AgentRun:
     """Class to execute Python code in an isolated Docker container.
 
@@ -52,10 +126,13 @@ class AgentRun:
         self.memory_limit = memory_limit
         self.memswap_limit = memswap_limit
         self.container_name = container_name
-        self.dependencies_whitelist = dependencies_whitelist
+        # frozenset for constant-time membership checks
+        self.dependencies_whitelist = frozenset(dependencies_whitelist)
         # this is to allow a mock client to be passed in for testing if docker is not available (not implemented yet)
         self.client = client or docker.from_env()
         self.cached_dependencies = cached_dependencies
+        # handle to the execution container, fetched and limited on first use (see get_container)
+        self.container = None
         try:
             self.client = client or docker.from_env()
             self.client.ping()
@@ -131,6 +208,7 @@ class AgentRun:
         """Execute a command in a Docker container with a timeout.
 
         This function runs the command in a separate thread and waits for the specified timeout.
+        The output is streamed and decoded incrementally, and truncated after MAX_OUTPUT_BYTES.
 
         Args:
             container: Docker container object
@@ -144,8 +222,29 @@ class AgentRun:
 
         def target():
             nonlocal exit_code, output
-            exec_log = container.exec_run(cmd=cmd, workdir="/code")
-            exit_code, output = exec_log.exit_code, exec_log.output
+            api = self.client.api
+            exec_id = api.exec_create(container.id, cmd=cmd, workdir="/code")["Id"]
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            parts = []
+            remaining = MAX_OUTPUT_BYTES
+            truncated = False
+            for chunk in api.exec_start(exec_id, stream=True):
+                # past the cap keep draining and discarding, so the process is never
+                # blocked on a full pipe and can exit with its real exit code
+                if truncated:
+                    continue
+                if len(chunk) > remaining:
+                    parts.append(decoder.decode(chunk[:remaining], final=True))
+                    truncated = True
+                    continue
+                remaining -= len(chunk)
+                parts.append(decoder.decode(chunk))
+            if truncated:
+                parts.append("\n[Output truncated]")
+            else:
+                parts.append(decoder.decode(b"", final=True))
+            exit_code = api.exec_inspect(exec_id)["ExitCode"]
+            output = "".join(parts)
 
         thread = Thread(target=target)
         thread.start()
@@ -153,18 +252,67 @@ class AgentRun:
         if thread.is_alive():
             thread.join(1)
             raise self.CommandTimeout("Command timed out")
-        output = output if output is not None else b""
-        return exit_code, output.decode("utf-8")
+        output = output if output is not None else ""
+        return exit_code, output
+
+    def kill_script(self, container: Container, script_name: str) -> None:
+        """Kill the processes running a script in the container.
+        Args:
+            container: Docker container object
+            script_name: Name of the script whose processes to kill
+        """
+        container.exec_run(
+            cmd=["python", "-c", _KILL_SCRIPT, f"/code/{script_name}"], workdir="/code"
+        )
+
+    def get_container(self) -> Container:
+        """Return the execution container, fetching it on first use.
+
+        The container is long-lived, so the handle is cached and the resource limits
+        are applied once when it is fetched rather than on every execution.
+
+        Returns:
+            Docker container object
+        """
+        if self.container is None:
+            container = self.client.containers.get(self.container_name)
+            container.update(
+                cpu_quota=self.cpu_quota,
+                mem_limit=self.memory_limit,
+                memswap_limit=self.memswap_limit,
+            )
+            self.container = container
+        return self.container
 
     def safety_check(self, python_code: str) -> dict[str, object]:
         """Check if Python code is safe to execute.
         This function uses common patterns and RestrictedPython to check for unsafe patterns in the code.
+        Results are cached, so repeated submissions of the same code are not parsed and compiled again.
 
         Args:
             python_code: Python code to check
         Returns:
             Dictionary with "safe" (bool) and "message" (str) keys
         """
+        key = hashlib.blake2b(
+            python_code.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        with _safety_cache_lock:
+            result = _safety_cache.get(key)
+            if result is not None:
+                _safety_cache.move_to_end(key)
+        if result is None:
+            result = self._safety_check(python_code)
+            with _safety_cache_lock:
+                _safety_cache[key] = result
+                if len(_safety_cache) > SAFETY_CACHE_SIZE:
+                    _safety_cache.popitem(last=False)
+        # copy so callers cannot mutate the cached result
+        return dict(result)
+
+    @staticmethod
+    def _safety_check(python_code: str) -> dict[str, object]:
+        """Uncached implementation of safety_check."""
         result = {"safe": True, "message": "The code is safe to execute."}
 
         # Crude check for problematic code (os, sys, subprocess, exec, eval, etc.)
@@ -260,27 +408,13 @@ class AgentRun:
         Returns:
             List of unique dependencies
         """
+        # every import statement contains the import keyword, so code without it needs no parsing
+        if not _IMPORT_KEYWORD_RE.search(python_code):
+            return []
         tree = ast.parse(python_code)
-        dependencies = []
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    # Get the base module name. E.g. for "import foo.bar", it's "foo"
-                    module_name = alias.name.split(".")[0]
-                    if (
-                        module_name not in sys.stdlib_module_names
-                        and module_name not in sys.builtin_module_names
-                    ):
-                        dependencies.append(module_name)
-            elif isinstance(node, ast.ImportFrom):
-                module_name = node.module.split(".")[0] if node.module else ""
-                if (
-                    module_name
-                    and module_name not in sys.stdlib_module_names
-                    and module_name not in sys.builtin_module_names
-                ):
-                    dependencies.append(module_name)
-        return list(set(dependencies))  # Return unique dependencies
+        collector = _ImportCollector()
+        collector.visit(tree)
+        return list(set(collector.dependencies))  # Return unique dependencies
     def install_dependencies(self, container: Container, dependencies: list) -> str:
         """Install dependencies in the container.
         Args:
@@ -350,14 +484,16 @@ class AgentRun:
         """
         result = {"success": False, "message": ""}
         script_name = f"script_{uuid4().hex}.py"
-        temp_script_path = os.path.join("/tmp", script_name)
-
-        with open(temp_script_path, "w") as file:
-            file.write(python_code)
+        script_bytes = python_code.encode("utf-8")
 
+        # build the archive in memory instead of round-tripping the script through a temp file
+        tar_info = tarfile.TarInfo(name=script_name)
+        tar_info.size = len(script_bytes)
+        tar_info.mode = 0o644
+        tar_info.mtime = int(time.time())
         tar_stream = BytesIO()
         with tarfile.open(fileobj=tar_stream, mode="w") as tar:
-            tar.add(temp_script_path, arcname=script_name)
+            tar.addfile(tar_info, BytesIO(script_bytes))
         tar_stream.seek(0)
 
         exec_result = container.put_archive(path="/code/", data=tar_stream)
@@ -375,7 +511,6 @@ class AgentRun:
             script_name: Name of the script to remove
         """
         if script_name:
-            os.remove(os.path.join("/tmp", script_name))
             container.exec_run(cmd=f"rm /code/{script_name}", workdir="/code")
             dep_uninstall_result = self.uninstall_dependencies(container, dependencies)
         return None
@@ -384,11 +519,12 @@ class AgentRun:
         """Executes Python code in an isolated Docker container.
         This is the main function to execute Python code in a Docker container. It performs the following steps:
         1. Check if the code is safe to execute
-        2. Update the container with the memory limits
+        2. Get the container (the memory limits are applied when it is first fetched)
         3. Copy the code to the container
         4. Install dependencies in the container
         5. Execute the code in the container
         5. Uninstall dependencies in the container & clean up
+        Steps 2-5 are retried once if the cached container no longer exists.
 
         Args:
             python_code: Python code to execute
@@ -396,11 +532,6 @@ class AgentRun:
             Output of the code execution or an error message
         """
         try:
-            output = ""
-            client = self.client
-            timeout_seconds = self.default_timeout
-            container = None
-
             # check  if the code is safe to execute
             safety_result = self.safety_check(python_code)
             safety_message = safety_result["message"]
@@ -408,14 +539,36 @@ class AgentRun:
             if not safe:
                 return safety_message
 
-            container = client.containers.get(self.container_name)
+            try:
+                return self.run_in_container(python_code)
+            except docker.errors.NotFound:
+                # the cached container was removed or recreated (e.g. by `docker compose up`),
+                # run_in_container dropped the stale handle so this attempt fetches it again
+                return self.run_in_container(python_code)
+
+        except Exception as e:
+            return str(e)
+
+    def run_in_container(self, python_code: str) -> str:
+        """Run already checked Python code once in the container.
+        Copies the code, installs its dependencies and executes it, then schedules the clean up.
+
+        Args:
+            python_code: Python code to execute
+        Returns:
+            Output of the code execution or an error message
+        Raises:
+            docker.errors.NotFound: If the container no longer exists. The cached handle is
+                dropped so the next call fetches the container again.
+        """
+        output = ""
+        timeout_seconds = self.default_timeout
+        container = None
+        script_name = None
+        dependencies = []
+        try:
+            container = self.get_container()
 
-            # update the container with the new limits
-            container.update(
-                cpu_quota=self.cpu_quota,
-                mem_limit=self.memory_limit,
-                memswap_limit=self.memswap_limit,
-            )
             # Copy the code to the container
             exec_result = self.copy_code_to_container(container, python_code)
             successful_copy = exec_result["success"]
@@ -436,17 +589,22 @@ class AgentRun:
                     container, f"python /code/{script_name}", timeout_seconds
                 )
             except self.CommandTimeout:
+                # stop the script instead of leaving it running in the container
+                self.kill_script(container, script_name)
                 return "Execution timed out."
 
-        except Exception as e:
-            return str(e)
+        except docker.errors.NotFound:
+            # the container is gone: drop the stale handle, and skip the clean up since
+            # it could only fail against it
+            self.container = None
+            container = None
+            raise
 
         finally:
             if container:
-                # run clean up in a seperate thread to avoid blocking the main thread
-                thread = Thread(
-                    target=self.clean_up, args=(container, script_name, dependencies)
+                # run clean up in the shared pool to avoid blocking the main thread
+                _CLEANUP_EXECUTOR.submit(
+                    self.clean_up, container, script_name, dependencies
                 )
-                thread.start()
 
         return output
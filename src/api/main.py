@@ -1,5 +1,7 @@
 import asyncio
+import atexit
 import os
+import threading
 from concurrent.futures import ThreadPoolExecutor
 
 #from fastapi import FastAPI
@@ -9,6 +11,11 @@ from pydantic import BaseModel
 from agentrun import AgentRun
 from fastmcp import FastMCP
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional and not available on Windows
+    uvloop = None
+
 
 class CodeSchema(BaseModel):
     code: str
@@ -18,6 +25,41 @@ class OutputSchema(BaseModel):
     output: str
 
 
+# Shared pool for the blocking container executions, reused across tool calls
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("CODE_EXEC_WORKERS", "8")),
+    thread_name_prefix="agentrun",
+)
+atexit.register(_EXECUTOR.shutdown, wait=False)
+
+# AgentRun instance shared by all tool calls, created on first use
+_RUNNER = None
+_RUNNER_LOCK = threading.Lock()
+
+
+def _get_runner() -> AgentRun:
+    """Return the shared AgentRun instance, creating it on first use.
+
+    Creating the runner connects to Docker and installs uv in the container,
+    so it is done once and reused. A failed creation is retried on the next call.
+    """
+    global _RUNNER
+    if _RUNNER is None:
+        with _RUNNER_LOCK:
+            if _RUNNER is None:
+                _RUNNER = AgentRun(
+                    container_name=os.environ.get("CONTAINER_NAME", "code-act-mcp_python_runner_1"),  # Default container name
+                    cached_dependencies=[],
+                    default_timeout=60 * 5,
+                )
+    return _RUNNER
+
+
+def _run_code(python_code: str) -> str:
+    """Execute Python code with the shared runner (blocking)."""
+    return _get_runner().execute_code_in_container(python_code)
+
+
 # Create the MCP server instance
 mcp = FastMCP("Code MCP Server")
 
@@ -28,16 +70,22 @@ async def execute_code(code: str) -> OutputSchema:
     Args:
         code: The Python code to execute
     """
-    # AgentRun 
-    runner = AgentRun(
-        container_name=os.environ.get("CONTAINER_NAME", "code-act-mcp_python_runner_1"),  # Default container name
-        cached_dependencies=[],
-        default_timeout=60 * 5,
-    )
     python_code = code
-    with ThreadPoolExecutor() as executor:
-        future = executor.submit(runner.execute_code_in_container, python_code)
-        output = await asyncio.wrap_future(future)
+    loop = asyncio.get_running_loop()
+    # the runner is created inside the worker so its setup does not block the event loop
+    output = await loop.run_in_executor(_EXECUTOR, _run_code, python_code)
     return OutputSchema(output=output)
 
 
+if __name__ == "__main__":
+    transport_kwargs = {
+        "transport": "sse",
+        "host": os.environ.get("HOST", "127.0.0.1"),
+        "port": int(os.environ.get("PORT", "3000")),
+    }
+    # `fastmcp run` starts its own asyncio loop before importing this module, so uvloop
+    # can only be used when the server is started from here
+    if uvloop is not None:
+        uvloop.run(mcp.run_async(**transport_kwargs))
+    else:
+        mcp.run(**transport_kwargs)